@@ -1,6 +1,8 @@
 import csv
 import sys
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from urllib.parse import urlparse
 from html import escape
@@ -9,6 +11,22 @@ from html import escape
 CSV_DRM_FIELDS = ["URL", "TIMESHIFT_URL"]
 
 
+def build_session() -> requests.Session:
+    """
+    Sessão única para reaproveitar conexões (keep-alive) entre os manifests.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+SESSION = build_session()
+
+
 def read_csv(csv_filename: str) -> list[dict]:
     """
     Lê um CSV com cabeçalho e retorna uma lista de dicionários (linhas).
@@ -44,9 +62,9 @@ def check_manifest(url: str) -> dict:
     }
 
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        content = response.text
+        with SESSION.get(url, timeout=(5, 30)) as response:
+            response.raise_for_status()
+            content = response.text
 
         path = urlparse(url).path.lower()
 
@@ -1,19 +1,237 @@
 import csv
+import hashlib
+import json
+import socket
 import sys
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import connection as urllib3_connection
+from urllib3.util.retry import Retry
 from pathlib import Path
 from urllib.parse import urlparse
 from html import escape
+from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
 
 
 CSV_DRM_FIELDS = ["URL", "TIMESHIFT_URL"]
-MAX_WORKERS = 3  # ajuste conforme capacidade / rede
+MAX_WORKERS = 16  # ajuste conforme capacidade / rede
+MAX_CONNECTIONS_PER_HOST = 8
+MAX_HOSTS = 50  # pools de conexão mantidos abertos (um por host)
+CHUNK_SIZE = 8192
+ESCAPE_CACHE_SIZE = 8192  # valores distintos do CSV guardados já escapados
+PROGRESS_INTERVAL = 0.5  # segundos entre atualizações do progresso
+CACHE_VERSION = 2  # incrementar quando a forma de classificar os manifests mudar
+CACHE_MAX_AGE = 7 * 24 * 3600  # segundos até um resultado em cache ser refeito
+
+MPD_DRM_MARKER = b"<ContentProtection"
+M3U8_KEY_MARKER = b"#EXT-X-KEY"
+M3U8_NO_KEY_MARKER = b"#EXT-X-KEY:METHOD=NONE"
+
+# Marcadores de MPD e M3U8 procurados em todo manifest. Buscas literais com
+# bytes.find são bem mais rápidas que uma regex com alternância, já que os
+# marcadores não têm prefixo comum.
+MANIFEST_MARKERS = (MPD_DRM_MARKER, M3U8_KEY_MARKER, M3U8_NO_KEY_MARKER)
+MARKER_OVERLAP = max(len(MPD_DRM_MARKER), len(M3U8_NO_KEY_MARKER)) - 1
+# marcadores que já definem o resultado; o restante do manifest é ignorado
+STOP_MARKERS = {MPD_DRM_MARKER, M3U8_NO_KEY_MARKER}
+# tipo do manifest quando a URL não tem extensão conhecida
+MARKER_TYPES = {MPD_DRM_MARKER: "MPD", M3U8_KEY_MARKER: "M3U8", M3U8_NO_KEY_MARKER: "M3U8"}
+
+
+def build_session() -> requests.Session:
+    """
+    Sessão compartilhada entre as threads: reaproveita conexões TCP/TLS
+    (keep-alive) para os mesmos hosts em vez de abrir uma por manifest.
+    Com pool_block, threads excedentes esperam uma conexão livre do host
+    em vez de abrir (e descartar) sockets extras.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=MAX_HOSTS,
+        pool_maxsize=MAX_CONNECTIONS_PER_HOST,
+        pool_block=True,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+SESSION = build_session()
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# (host, porta) -> endereços já resolvidos, compartilhado entre as threads
+DNS_CACHE: dict[tuple[str, int], list[str]] = {}
+_create_connection = urllib3_connection.create_connection
+
+
+def resolve_host(host: str, port: int) -> list[str]:
+    key = (host, port)
+    addresses = DNS_CACHE.get(key)
+    if addresses is None:
+        infos = socket.getaddrinfo(
+            host, port, urllib3_connection.allowed_gai_family(), socket.SOCK_STREAM
+        )
+        addresses = list(dict.fromkeys(sockaddr[0] for *_, sockaddr in infos))
+        DNS_CACHE[key] = addresses
+    return addresses
+
+
+def cached_create_connection(address, *args, **kwargs):
+    """
+    Substitui urllib3.util.connection.create_connection para conectar
+    usando DNS_CACHE; o TLS continua usando o hostname original (SNI).
+    """
+    host, port = address
+    try:
+        addresses = resolve_host(host.strip("[]"), port)
+    except OSError:
+        # deixa o urllib3 resolver e reportar o erro normalmente
+        return _create_connection(address, *args, **kwargs)
+
+    error = OSError(f"Nenhum endereço encontrado para {host}")
+    for ip in addresses:
+        try:
+            return _create_connection((ip, port), *args, **kwargs)
+        except OSError as e:
+            error = e
+    raise error
+
+
+urllib3_connection.create_connection = cached_create_connection
+
+
+def prewarm_dns(urls: list[str]):
+    """
+    Resolve em paralelo todos os hosts do CSV antes das requisições.
+    """
+    targets = set()
+    for url in urls:
+        try:
+            parsed = urlparse(url)
+            port = parsed.port or DEFAULT_PORTS.get(parsed.scheme, 80)
+        except ValueError:
+            continue
+        if parsed.hostname:
+            targets.add((parsed.hostname, port))
+
+    def warm(target):
+        try:
+            resolve_host(*target)
+        except OSError:
+            pass  # o erro aparece na própria requisição
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(warm, targets))
+
+
+# url -> {"etag", "last_modified", "type", "drm_found", "saved_at"} da última execução
+CACHE: dict[str, dict] = {}
+
+
+def load_cache(cache_file: Path) -> dict[str, dict]:
+    """
+    Descarta o arquivo inteiro se foi gravado por outra versão do cache, e
+    as entradas mais antigas que CACHE_MAX_AGE, para que um 304 não mantenha
+    para sempre um resultado antigo.
+    """
+    if not cache_file.exists():
+        return {}
+    try:
+        data = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        return {}
+
+    now = time.time()
+    return {
+        url: entry
+        for url, entry in data.get("entries", {}).items()
+        if now - entry.get("saved_at", 0) < CACHE_MAX_AGE
+    }
+
+
+def save_cache(cache: dict[str, dict], cache_file: Path):
+    data = {"version": CACHE_VERSION, "entries": cache}
+    cache_file.write_text(json.dumps(data), encoding="utf-8")
+
+
+def progress_header(csv_path: Path) -> dict:
+    """
+    Identifica a execução a que o arquivo de progresso pertence: versão dos
+    resultados e o CSV de entrada (caminho e hash do conteúdo).
+    """
+    return {
+        "version": CACHE_VERSION,
+        "csv": str(csv_path),
+        "csv_sha256": hashlib.sha256(csv_path.read_bytes()).hexdigest(),
+    }
+
+
+def load_progress(progress_file: Path, header: dict) -> dict[str, dict]:
+    """
+    Relê os resultados gravados por uma execução interrompida (uma linha
+    JSON {url: resultado} por manifest) para não verificá-los de novo.
+    O arquivo inteiro é ignorado se a primeira linha não corresponder a
+    `header` ou se tiver mais de CACHE_MAX_AGE.
+    """
+    if not progress_file.exists():
+        return {}
+
+    done = {}
+    with progress_file.open(encoding="utf-8") as f:
+        try:
+            saved = json.loads(f.readline())
+        except ValueError:
+            return {}
+        if not isinstance(saved, dict) or "started_at" not in saved:
+            return {}
+        started_at = saved.pop("started_at")
+        if saved != header or time.time() - started_at >= CACHE_MAX_AGE:
+            return {}
+
+        for line in f:
+            try:
+                done.update(json.loads(line))
+            except ValueError:
+                continue  # última linha cortada pela interrupção
+    return {url: res for url, res in done.items() if res["checked"] and not res["error"]}
+
+
+def open_progress(progress_file: Path, header: dict, resume: bool):
+    """
+    Abre o arquivo de progresso para acrescentar resultados, com buffer de
+    linha para que cada resultado chegue ao disco mesmo se o processo for
+    morto. Sem `resume`, recomeça o arquivo com `header` na primeira linha.
+    Se a execução anterior deixou a última linha cortada, começa numa linha
+    nova para não colar o próximo registro no fragmento.
+    """
+    if not resume:
+        progress = progress_file.open("w", encoding="utf-8", buffering=1)
+        progress.write(json.dumps({**header, "started_at": time.time()}) + "\n")
+        return progress
+
+    with progress_file.open("rb") as f:
+        f.seek(-1, 2)
+        needs_newline = f.read(1) != b"\n"
+
+    progress = progress_file.open("a", encoding="utf-8", buffering=1)
+    if needs_newline:
+        progress.write("\n")
+    return progress
 
 
-def read_csv(csv_filename: str) -> list[dict]:
+def read_csv(csv_filename: str) -> tuple[dict[str, int], list[tuple[str, ...]]]:
+    """
+    Retorna o mapa {coluna: índice} do cabeçalho e as linhas como tuplas,
+    sem alocar um dict por linha. Como no csv.DictReader, linhas em branco
+    são ignoradas e linhas curtas são completadas com "".
+    """
     script_dir = Path(__file__).resolve().parent
     csv_path = script_dir / csv_filename
 
@@ -21,8 +239,39 @@ def read_csv(csv_filename: str) -> list[dict]:
         raise FileNotFoundError(f"Arquivo CSV não encontrado: {csv_path}")
 
     with csv_path.open(newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        return list(reader)
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns = {h: i for i, h in enumerate(header)}
+        width = len(header)
+        rows = [tuple(r) + ("",) * (width - len(r)) for r in reader if r]
+        return columns, rows
+
+
+def scan_markers(response: requests.Response) -> list[bytes]:
+    """
+    Lê o corpo da resposta em blocos (bytes, sem decodificar) e retorna os
+    marcadores encontrados, na ordem em que aparecem no manifest.
+    Interrompe a leitura assim que um marcador de STOP_MARKERS aparece, pois
+    o restante do manifest não altera o resultado.
+    """
+    found = []
+    tail = b""
+
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        # mantém o final do bloco anterior para achar marcadores divididos
+        buf = tail + chunk
+        hits = []
+        for marker in MANIFEST_MARKERS:
+            if marker not in found:
+                pos = buf.find(marker)
+                if pos != -1:
+                    hits.append((pos, marker))
+        found.extend(marker for _, marker in sorted(hits))
+        if not STOP_MARKERS.isdisjoint(found):
+            break
+        tail = buf[-MARKER_OVERLAP:]
+
+    return found
 
 
 def check_manifest(url: str) -> dict:
@@ -31,21 +280,52 @@ def check_manifest(url: str) -> dict:
 
     result = {"checked": True, "type": "UNKNOWN", "drm_found": False, "error": None}
 
-    try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        content = response.text
-        path = urlparse(url).path.lower()
-
-        if path.endswith(".mpd"):
-            result["type"] = "MPD"
-            result["drm_found"] = "<ContentProtection" in content
+    # GET condicional: se o manifest não mudou o servidor responde 304 sem corpo
+    cached = CACHE.get(url)
+    headers = {}
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
 
-        elif path.endswith(".m3u8"):
-            result["type"] = "M3U8"
-            has_key = "#EXT-X-KEY" in content
-            method_none = "#EXT-X-KEY:METHOD=NONE" in content
-            result["drm_found"] = has_key and not method_none
+    try:
+        with SESSION.get(url, headers=headers, timeout=(5, 30), stream=True) as response:
+            response.raise_for_status()
+
+            if response.status_code == 304 and cached:
+                result["type"] = cached["type"]
+                result["drm_found"] = cached["drm_found"]
+                return result
+
+            found = scan_markers(response)
+
+            # a extensão define o tipo; sem ela, vale o primeiro marcador
+            path = urlparse(url).path.lower()
+            if path.endswith(".mpd"):
+                result["type"] = "MPD"
+            elif path.endswith(".m3u8"):
+                result["type"] = "M3U8"
+            elif found:
+                result["type"] = MARKER_TYPES[found[0]]
+
+            if result["type"] == "MPD":
+                result["drm_found"] = MPD_DRM_MARKER in found
+            elif result["type"] == "M3U8":
+                method_none = M3U8_NO_KEY_MARKER in found
+                has_key = method_none or M3U8_KEY_MARKER in found
+                result["drm_found"] = has_key and not method_none
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                CACHE[url] = {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "type": result["type"],
+                    "drm_found": result["drm_found"],
+                    "saved_at": time.time(),
+                }
 
     except requests.RequestException as e:
         result["error"] = str(e)
@@ -53,50 +333,20 @@ def check_manifest(url: str) -> dict:
     return result
 
 
-def process_row(index: int, row: dict) -> tuple[int, dict]:
-    """
-    Processa uma linha do CSV (URL + TIMESHIFT_URL)
-    """
-    drm_results = {}
-    for field in CSV_DRM_FIELDS:
-        drm_results[field] = check_manifest(row.get(field, "").strip())
-    return index, drm_results
-
-
 def format_time(seconds: float) -> str:
     m, s = divmod(int(seconds), 60)
     return f"{m:02d}:{s:02d}"
 
 
-def generate_html_report(rows: list[dict], results: list[dict], output_file: Path):
-    headers = [h for h in rows[0].keys() if h not in CSV_DRM_FIELDS]
+def compact_html(template: str) -> str:
+    """
+    Remove a indentação do template: o navegador ignora esses espaços, que
+    só aumentam o arquivo gerado.
+    """
+    return "\n".join(line.strip() for line in template.strip().splitlines()) + "\n"
 
-    def status_cell(res):
-        if not res["checked"]:
-            return '<td class="na">-</td>'
-        if res["error"]:
-            return '<td class="erro">ERRO</td>'
-        if res["drm_found"]:
-            return '<td class="sim">SIM</td>'
-        return '<td class="nao">NÃO</td>'
 
-    table_rows = []
-
-    for idx, (row, drm) in enumerate(zip(rows, results), start=1):
-        table_rows.append(f"""
-        <tr>
-            <td>{idx}</td>
-            {''.join(f"<td>{escape(row[h])}</td>" for h in headers)}
-            <td>{escape(row.get("URL", ""))}</td>
-            {status_cell(drm["URL"])}
-            <td>{drm["URL"]["type"]}</td>
-            <td>{escape(row.get("TIMESHIFT_URL", ""))}</td>
-            {status_cell(drm["TIMESHIFT_URL"])}
-            <td>{drm["TIMESHIFT_URL"]["type"]}</td>
-        </tr>
-        """)
-
-    html = f"""
+REPORT_HEAD = compact_html("""
     <!DOCTYPE html>
     <html lang="pt-BR">
     <head>
@@ -119,7 +369,7 @@ def generate_html_report(rows: list[dict], results: list[dict], output_file: Pat
             <thead>
                 <tr>
                     <th>#</th>
-                    {''.join(f"<th>{h}</th>" for h in headers)}
+                    {header_cells}
                     <th>URL</th>
                     <th>DRM (SIM/NÃO)</th>
                     <th>EXTENSÃO</th>
@@ -129,14 +379,66 @@ def generate_html_report(rows: list[dict], results: list[dict], output_file: Pat
                 </tr>
             </thead>
             <tbody>
-                {''.join(table_rows)}
+""")
+
+REPORT_TAIL = compact_html("""
             </tbody>
         </table>
     </body>
     </html>
+""")
+
+
+def generate_html_report(
+    columns: dict[str, int],
+    rows: list[tuple[str, ...]],
+    results: list[dict],
+    output_file: Path,
+):
+    """
+    Escreve o relatório direto no arquivo, linha a linha, sem montar o HTML
+    inteiro em memória.
     """
+    headers = tuple(h for h in columns if h not in CSV_DRM_FIELDS)
+    header_idx = tuple(columns[h] for h in headers)
+    drm_idx = tuple(columns.get(field) for field in CSV_DRM_FIELDS)
+    # colunas categóricas (canal, grupo...) repetem muito entre as linhas
+    esc = lru_cache(maxsize=ESCAPE_CACHE_SIZE)(escape)
+
+    def status_cell(res):
+        if not res["checked"]:
+            return '<td class="na">-</td>'
+        if res["error"]:
+            return '<td class="erro">ERRO</td>'
+        if res["drm_found"]:
+            return '<td class="sim">SIM</td>'
+        return '<td class="nao">NÃO</td>'
 
-    output_file.write_text(html, encoding="utf-8")
+    # TextIOWrapper sobre o arquivo binário: as escritas são acumuladas e
+    # codificadas em UTF-8 em blocos; newline="" grava "\n" sem conversão
+    with output_file.open("w", encoding="utf-8", newline="") as out:
+        write = out.write
+        write(REPORT_HEAD.format(header_cells="".join(f"<th>{h}</th>" for h in headers)))
+
+        for idx, (row, drm) in enumerate(zip(rows, results), start=1):
+            write("<tr><td>")
+            write(str(idx))
+            write("</td>")
+            for i in header_idx:
+                write("<td>")
+                write(esc(row[i]))
+                write("</td>")
+            for field, i in zip(CSV_DRM_FIELDS, drm_idx):
+                write("<td>")
+                write(esc(row[i]) if i is not None else "")
+                write("</td>")
+                write(status_cell(drm[field]))
+                write("<td>")
+                write(drm[field]["type"])
+                write("</td>")
+            write("</tr>\n")
+
+        write(REPORT_TAIL)
 
 
 def main():
@@ -147,40 +449,81 @@ def main():
     csv_filename = sys.argv[1]
     script_dir = Path(__file__).resolve().parent
     output_html = script_dir / "relatorio.html"
+    cache_file = script_dir / "drm_cache.json"
+    progress_file = script_dir / "drm_progress.jsonl"
 
-    rows = read_csv(csv_filename)
-    total = len(rows)
-    results = [None] * total
+    columns, rows = read_csv(csv_filename)
+    header = progress_header(script_dir / csv_filename)
+    CACHE.update(load_cache(cache_file))
 
-    completed = 0
-    lock = Lock()
-    start_time = time.time()
+    drm_idx = [columns.get(field) for field in CSV_DRM_FIELDS]
+    urls = [
+        [row[i].strip() if i is not None else "" for i in drm_idx]
+        for row in rows
+    ]
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {
-            executor.submit(process_row, idx, row): idx
-            for idx, row in enumerate(rows)
-        }
+    checked = load_progress(progress_file, header)
+    if checked:
+        print(f"Retomando: {len(checked)} manifests já verificados")
 
-        for future in as_completed(futures):
-            idx, drm_result = future.result()
-            results[idx] = drm_result
+    # dict em vez de set para manter a ordem do CSV
+    pending = {url: None for row_urls in urls for url in row_urls if url not in checked}
+    prewarm_dns(list(pending))
 
-            with lock:
-                completed += 1
-                elapsed = time.time() - start_time
-                avg = elapsed / completed
-                remaining = avg * (total - completed)
-
-                print(
-                    f"[{completed}/{total}] "
-                    f"Decorrido: {format_time(elapsed)} | "
-                    f"ETA: {format_time(remaining)}"
-                )
-
-    generate_html_report(rows, results, output_html)
-
-    total_time = time.time() - start_time
+    completed = 0
+    start_time = time.monotonic()
+    last_print = 0.0
+
+    # Cada manifest distinto é uma tarefa independente, para que as
+    # requisições de linhas diferentes se sobreponham no pool de threads; uma
+    # URL repetida no CSV (ex.: TIMESHIFT_URL comum a vários canais) é
+    # verificada uma única vez.
+    progress = open_progress(progress_file, header, resume=bool(checked))
+    with progress, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(check_manifest, url): url for url in pending}
+        total = len(futures)
+
+        # Só a thread principal consome os resultados, então o contador não
+        # precisa de lock; o progresso é impresso no máximo a cada intervalo.
+        for future in as_completed(futures):
+            url = futures[future]
+            result = checked[url] = future.result()
+            completed += 1
+
+            # só resultados válidos são retomados; erros são verificados de novo
+            if result["checked"] and not result["error"]:
+                progress.write(json.dumps({url: result}) + "\n")
+
+            now = time.monotonic()
+            if now - last_print < PROGRESS_INTERVAL and completed < total:
+                continue
+            last_print = now
+
+            elapsed = now - start_time
+            avg = elapsed / completed
+            remaining = avg * (total - completed)
+
+            # \r sobrescreve a mesma linha do terminal a cada atualização
+            sys.stderr.write(
+                f"\r[{completed}/{total}] "
+                f"Decorrido: {format_time(elapsed)} | "
+                f"ETA: {format_time(remaining)}"
+            )
+            sys.stderr.flush()
+
+    if completed:
+        sys.stderr.write("\n")
+
+    results = [
+        {field: checked[url] for field, url in zip(CSV_DRM_FIELDS, row_urls)}
+        for row_urls in urls
+    ]
+
+    save_cache(CACHE, cache_file)
+    generate_html_report(columns, rows, results, output_html)
+    progress_file.unlink(missing_ok=True)
+
+    total_time = time.monotonic() - start_time
     print(f"\nProcesso concluído em {format_time(total_time)}")
     print(f"Relatório gerado: {output_html}")
 